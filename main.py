@@ -5,27 +5,50 @@ import sys
 import sqlite3
 import logging
 import fcntl
-from datetime import datetime, timedelta
-import re
+import atexit
+import time
 import asyncio
+import threading
+import io
+import itertools
 import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 # OPTIONAL IMPORTS (PDF and OCR)
+# PyMuPDF is preferred for text extraction; PyPDF2 is the fallback.
 pdf_available = True
 try:
-    import PyPDF2
+    import fitz
 except ImportError:
-    pdf_available = False
+    fitz = None
+    try:
+        from PyPDF2 import PdfReader
+    except ImportError:
+        pdf_available = False
 
-pytesseract_available = True
 pillow_available = True
 try:
-    import pytesseract
-    from PIL import Image
+    from PIL import Image, ImageStat
 except ImportError:
-    pytesseract_available = False
     pillow_available = False
 
+# tesserocr keeps Tesseract loaded in-process; pytesseract is the fallback.
+tesserocr_available = True
+try:
+    from tesserocr import PyTessBaseAPI, PSM
+except ImportError:
+    tesserocr_available = False
+
+pytesseract_available = True
+try:
+    from pytesseract import image_to_string
+except ImportError:
+    pytesseract_available = False
+ocr_available = pillow_available and (tesserocr_available or pytesseract_available)
+
 from telegram import (
     Update,
     ChatPermissions,
@@ -39,17 +62,138 @@ from telegram.ext import (
 )
 from telegram.helpers import escape_markdown
 
+from utils import is_arabic
+
 # ------------------- Configuration -------------------
 DATABASE = 'warnings.db'
 ALLOWED_USER_ID = 6177929931  # Replace with your own Telegram user ID
 LOCK_FILE = '/tmp/telegram_bot.lock'
 MESSAGE_DELETE_TIMEFRAME = 15  # seconds
+OCR_LANG = 'ara+eng'
+OCR_MAX_WIDTH = 1600  # px; larger photos are downscaled before OCR
+OCR_THRESHOLD = 160   # grayscale cut-off used to binarize photos
+MAX_PDF_PAGES = 30  # pages scanned per PDF; bounds the work a huge upload can cause
+MAX_DOWNLOAD_SIZE = 20 * 1024 * 1024  # bytes; Bot API getFile refuses larger files
+OCR_MIN_SIDE = 200     # px; smaller images are skipped as unlikely to hold text
+OCR_MIN_STDDEV = 20.0  # grayscale spread below which an image is treated as textless
+OCR_PHOTO_MIN_SIDE = 800  # px; smallest Telegram photo size still legible to OCR
+OSD_MIN_SCRIPT_CONF = 2.0  # below this, fall back to full OCR (tesserocr only)
+OCR_BATCH_SIZE = 8       # max photos handed to one OCR worker call
+OCR_BATCH_WINDOW = 0.15  # seconds to wait for more photos to batch
+FILE_VERDICT_CACHE_SIZE = 10000  # remembered PDF/photo results, keyed by file_unique_id
 
 # If a user is "member", "administrator", or "creator", we can't restrict them
 ALLOWED_STATUSES = ("member", "administrator", "creator")
 
-# In-memory dict for group name requests
-pending_group_names = {}
+# Max concurrent membership lookups issued by a single /check
+CHECK_CONCURRENCY = 8
+# Telegram rejects messages longer than this many characters
+MAX_MESSAGE_LENGTH = 4096
+# Bans issued per second by /check, under Telegram's ~30 actions/s bot limit
+CHECK_BANS_PER_SECOND = 25
+# Keep-alive HTTPS connections shared by all Bot API calls (PTB defaults to 1)
+BOT_CONNECTION_POOL_SIZE = 64
+
+# Group awaiting a name from /group_add. Only ALLOWED_USER_ID can register
+# groups, so a single slot is enough.
+pending_group_id = None
+
+VALID_PERMISSION_TYPES = (
+    "text", "photos", "videos", "files", "music",
+    "gifs", "voice", "video_messages", "inlinebots",
+    "embed_links", "polls", "stickers", "games"
+)
+VALID_PERMISSION_TYPES_STR = ", ".join(VALID_PERMISSION_TYPES)
+
+# /limit permission_type -> ChatPermissions field it toggles
+PERMISSION_FIELDS = {
+    "text": "can_send_messages",
+    **{p: "can_send_media_messages" for p in (
+        "photos", "videos", "files", "music", "gifs",
+        "voice", "video_messages", "inlinebots", "embed_links"
+    )},
+    "polls": "can_send_polls",
+    "stickers": "can_send_other_messages",
+    "games": "can_send_other_messages",
+}
+
+# The few ChatPermissions shapes the bot applies, built once.
+_ALL_ALLOWED = {
+    "can_send_messages": True,
+    "can_send_media_messages": True,
+    "can_send_polls": True,
+    "can_send_other_messages": True,
+    "can_add_web_page_previews": True
+}
+PERMISSIONS_ALL = ChatPermissions(**_ALL_ALLOWED)
+PERMISSIONS_MUTED = ChatPermissions(can_send_messages=False)
+PERMISSIONS_WITHOUT = {
+    field: ChatPermissions(**{**_ALL_ALLOWED, field: False})
+    for field in set(PERMISSION_FIELDS.values())
+}
+
+# ------------------- Pre-rendered Replies -------------------
+# Static replies never change, so they are MarkdownV2-escaped once here.
+USAGE_TEXTS = {
+    "group_add": "/group_add <group_id>",
+    "back_group": "/back_group <group_id> <user_id>",
+    "rmove_group": "/rmove_group <group_id>",
+    "bypass": "/bypass <user_id>",
+    "unbypass": "/unbypass <user_id>",
+    "love": "/love <group_id> <user_id>",
+    "rmove_user": "/rmove_user <group_id> <user_id>",
+    "mute": "/mute <group_id> <user_id> <minutes>",
+    "unmute": "/unmute <group_id> <user_id>",
+    "slow": "/slow <group_id> <delay_in_seconds>",
+    "be_sad": "/be_sad <group_id>",
+    "be_happy": "/be_happy <group_id>",
+    "check": "/check <group_id>",
+    "link": "/link <group_id>",
+    "limit": (
+        "/limit <group_id> <user_id> <permission_type> <on/off>\n"
+        "Valid types: " + VALID_PERMISSION_TYPES_STR
+    ),
+}
+USAGE_MD = {
+    cmd: escape_markdown(f"⚠️ Usage: {usage}", version=2)
+    for cmd, usage in USAGE_TEXTS.items()
+}
+START_MD = escape_markdown("✅ Bot is running.", version=2)
+HELP_TEXT = (
+    "Available Commands:\n\n"
+    "• /start – Check if the bot is running.\n"
+    "• /help – Show help text.\n"
+    "• /group_add <group_id> – Register a group.\n"
+    "• /rmove_group <group_id> – Unregister a group.\n"
+    "• /bypass <user_id> – Add a user to bypass list.\n"
+    "• /unbypass <user_id> – Remove a user from bypass list.\n"
+    "• /love <group_id> <user_id> – Remove a user from 'Removed Users'.\n"
+    "• /back_group <group_id> <user_id> – Remove a user from 'Removed Users' without banning.\n"
+    "• /rmove_user <group_id> <user_id> – Force remove user from group.\n"
+    "• /mute <group_id> <user_id> <minutes> – Mute user.\n"
+    "• /unmute <group_id> <user_id> – Remove mute from user.\n"
+    "• /limit <group_id> <user_id> <permission_type> <on/off> – Toggle permission.\n"
+    "• /slow <group_id> <seconds> – Placeholder for slow mode.\n"
+    "• /be_sad <group_id> – Enable Arabic deletion.\n"
+    "• /be_happy <group_id> – Disable Arabic deletion.\n"
+    "• /check <group_id> – Validate 'Removed Users' vs actual membership.\n"
+    "• /link <group_id> – Create one-time invite link.\n"
+    "• /permission_type – Show valid <permission_type> for /limit.\n"
+    "• /get_id – Send this chat’s ID.\n\n"
+    "Note: The bot must be admin with 'can_restrict_members' to effectively mute/limit."
+)
+HELP_MD = escape_markdown(HELP_TEXT, version=2)
+SUPERGROUP_ONLY_MD = escape_markdown(
+    "⚠️ Restrictions only work in supergroups (ids starting with -100).", version=2
+)
+UNKNOWN_PERMISSION_MD = escape_markdown(
+    f"⚠️ Unknown permission_type. Valid types: {VALID_PERMISSION_TYPES_STR}", version=2
+)
+PERMISSION_TYPES_MD = escape_markdown(
+    "Possible permission_type values:\n\n"
+    + "\n".join(f"• {ptype}" for ptype in VALID_PERMISSION_TYPES),
+    version=2
+)
 
 # ------------------- Logging Setup -------------------
 logging.basicConfig(
@@ -61,33 +205,116 @@ logger = logging.getLogger(__name__)
 # ------------------- File Lock Mechanism -------------------
 def acquire_lock():
     """ Acquire an exclusive file lock so only one bot instance can run. """
+    # O_CREAT without O_TRUNC: a running instance's PID is not wiped by a
+    # second process that then fails to get the lock.
+    fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600)
     try:
-        lock_file = open(LOCK_FILE, 'w')
-        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
-        logger.info("Lock acquired. Only one instance running.")
-        return lock_file
-    except IOError:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
         logger.error("Another instance of this bot is already running. Exiting.")
         sys.exit("Another instance is already running.")
+    os.ftruncate(fd, 0)
+    os.write(fd, f"{os.getpid()}\n".encode())
+    logger.info("Lock acquired. Only one instance running.")
+    return fd
 
-def release_lock(lock_file):
+def release_lock(fd):
     """ Release the file lock upon exit. """
+    # The file is left in place: removing it could unlink an inode another
+    # instance has just locked, letting a third start alongside it.
     try:
-        fcntl.flock(lock_file, fcntl.LOCK_UN)
-        lock_file.close()
-        os.remove(LOCK_FILE)
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
         logger.info("Lock released. Bot stopped.")
     except Exception as e:
         logger.error(f"Error releasing lock: {e}")
 
-lock_file = acquire_lock()
-import atexit
-atexit.register(release_lock, lock_file)
-
 # ------------------- DB Initialization -------------------
+def _connect(**kwargs):
+    """ Open a connection with the per-connection PRAGMAs applied. """
+    conn = sqlite3.connect(DATABASE, **kwargs)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-64000")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+# Shared connection, opened on first use; SQLite's page cache and the
+# sqlite3 statement cache then persist across calls. isolation_level=None
+# leaves each statement in autocommit unless a transaction is opened.
+_conn = None
+
+# Handlers run DB work in worker threads through run_db(); this lock keeps
+# those threads from interleaving statements on the shared connection.
+_db_lock = threading.RLock()
+
+def get_conn():
+    global _conn
+    if _conn is None:
+        _conn = _connect(check_same_thread=False, isolation_level=None,
+                         cached_statements=256)
+        # Set once here; every helper shares this connection, so deleting a
+        # group cascades to its deletion_settings and removed_users rows.
+        _conn.execute("PRAGMA foreign_keys=ON")
+        atexit.register(_conn.close)
+    return _conn
+
+@contextmanager
+def _tx():
+    """ Run several helper calls as one BEGIN ... COMMIT on the shared connection. """
+    conn = get_conn()
+    with _db_lock:
+        conn.execute("BEGIN")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            try:
+                conn.execute("ROLLBACK")
+                # Helpers update the caches as they write; resync after undoing them.
+                load_caches()
+            except Exception as e:
+                # Don't let a failed cleanup replace the error that caused it.
+                logger.error(f"Rollback or cache resync failed: {e}")
+            raise
+
+def _locked_call(func, *args):
+    with _db_lock:
+        return func(*args)
+
+async def run_db(func, *args):
+    """ Run a blocking DB helper in a worker thread so commits don't stall the event loop. """
+    return await asyncio.to_thread(_locked_call, func, *args)
+
+def _cascade_group_fk(conn, table):
+    """ Rebuild a table created before its group_id FK had ON DELETE CASCADE. """
+    fks = conn.execute(f"PRAGMA foreign_key_list({table})").fetchall()
+    if all(fk[6] == 'CASCADE' for fk in fks):
+        return
+    sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)
+    ).fetchone()[0]
+    new_sql = sql.replace(table, f"{table}_new", 1).replace(
+        "REFERENCES groups(group_id)", "REFERENCES groups(group_id) ON DELETE CASCADE"
+    )
+    # SQLite can't alter a constraint in place; copy into a new table with
+    # enforcement off so rows for already-deleted groups don't abort the copy.
+    conn.execute("PRAGMA foreign_keys=OFF")
+    try:
+        with _tx():
+            conn.execute(new_sql)
+            conn.execute(f"INSERT INTO {table}_new SELECT * FROM {table}")
+            conn.execute(f"DROP TABLE {table}")
+            conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    finally:
+        conn.execute("PRAGMA foreign_keys=ON")
+    logger.info(f"Migrated {table} to ON DELETE CASCADE.")
+
 def init_permissions_db():
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_conn()
         c = conn.cursor()
         c.execute('''
             CREATE TABLE IF NOT EXISTS permissions (
@@ -102,20 +329,21 @@ def init_permissions_db():
                 removal_reason TEXT,
                 removal_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 PRIMARY KEY (group_id, user_id),
-                FOREIGN KEY (group_id) REFERENCES groups(group_id)
+                FOREIGN KEY (group_id) REFERENCES groups(group_id) ON DELETE CASCADE
             )
         ''')
-        conn.commit()
-        conn.close()
+        _cascade_group_fk(conn, 'removed_users')
         logger.info("Permissions & Removed Users tables initialized.")
-    except Exception as e:
+    except sqlite3.Error as e:
         logger.error(f"Failed to init permissions DB: {e}")
         raise
 
 def init_db():
     try:
-        conn = sqlite3.connect(DATABASE)
-        conn.execute("PRAGMA foreign_keys = 1")
+        conn = get_conn()
+        # WAL is persistent in the database file, so it only needs setting once.
+        if DATABASE != ':memory:':
+            conn.execute("PRAGMA journal_mode=WAL")
         c = conn.cursor()
 
         # groups
@@ -138,7 +366,7 @@ def init_db():
             CREATE TABLE IF NOT EXISTS deletion_settings (
                 group_id INTEGER PRIMARY KEY,
                 enabled BOOLEAN NOT NULL DEFAULT 0,
-                FOREIGN KEY(group_id) REFERENCES groups(group_id)
+                FOREIGN KEY(group_id) REFERENCES groups(group_id) ON DELETE CASCADE
             )
         ''')
 
@@ -152,177 +380,220 @@ def init_db():
             )
         ''')
 
-        conn.commit()
-        conn.close()
+        _cascade_group_fk(conn, 'deletion_settings')
         logger.info("Main DB tables initialized.")
         init_permissions_db()
-
-    except Exception as e:
+        # Seed planner statistics once; PRAGMA optimize keeps them current after that.
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'").fetchone():
+            conn.execute("ANALYZE")
+        # Refresh planner statistics where they are stale; cheap when nothing changed.
+        conn.execute("PRAGMA optimize")
+        load_caches()
+
+    except sqlite3.Error as e:
         logger.error(f"Failed to initialize DB: {e}")
         raise
 
-# ------------------- DB Helpers -------------------
+# Hot-path queries, kept as constants so the connection's statement cache
+# reuses the prepared statements instead of re-parsing the SQL.
+SQL_REMOVED_USER_IDS = 'SELECT user_id FROM removed_users WHERE group_id=?'
+
+# In-memory mirrors of groups, bypass_users and the enabled rows of
+# deletion_settings. They are loaded at startup and updated by the helpers
+# below after each write, so per-message checks are set lookups instead of queries.
+_known_groups = set()
+_bypass_users = set()
+_deletion_enabled_groups = set()
+
+def load_caches():
+    # Each set is rebuilt off to the side and swapped in with one assignment,
+    # so handlers reading them on the event loop never see a half-loaded set.
+    global _known_groups, _bypass_users, _deletion_enabled_groups
+    conn = get_conn()
+    known_groups = {r[0] for r in conn.execute('SELECT group_id FROM groups')}
+    bypass_users = {r[0] for r in conn.execute('SELECT user_id FROM bypass_users')}
+    deletion_enabled = {
+        r[0] for r in conn.execute('SELECT group_id FROM deletion_settings WHERE enabled=1')
+    }
+    _known_groups, _bypass_users, _deletion_enabled_groups = known_groups, bypass_users, deletion_enabled
+    logger.info(
+        f"Loaded caches: {len(_known_groups)} group(s), {len(_bypass_users)} bypass user(s), "
+        f"deletion enabled in {len(_deletion_enabled_groups)} group(s)."
+    )
+
 def add_group(group_id):
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_conn()
         c = conn.cursor()
         c.execute(
             "INSERT OR IGNORE INTO groups (group_id, group_name) VALUES (?, ?)",
             (group_id, None)
         )
-        conn.commit()
-        conn.close()
+        _known_groups.add(group_id)
         logger.info(f"Added group {group_id} to DB.")
-    except Exception as e:
+    except sqlite3.Error as e:
         logger.error(f"Error adding group {group_id}: {e}")
         raise
 
 def set_group_name(group_id, name):
+    """ Name a group; returns False if the group is not registered. """
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_conn()
         c = conn.cursor()
         c.execute('UPDATE groups SET group_name=? WHERE group_id=?', (name, group_id))
-        conn.commit()
-        conn.close()
+        if c.rowcount == 0:
+            logger.warning(f"Group {group_id} not found; name not set.")
+            return False
         logger.info(f"Group {group_id} name set to '{name}'.")
-    except Exception as e:
+        return True
+    except sqlite3.Error as e:
         logger.error(f"Error setting name for group {group_id}: {e}")
         raise
 
+def remove_group(group_id):
+    """ Delete a group; returns True if it existed. """
+    # deletion_settings and removed_users rows go with it via ON DELETE CASCADE.
+    c = get_conn().execute('DELETE FROM groups WHERE group_id=?', (group_id,))
+    _known_groups.discard(group_id)
+    _deletion_enabled_groups.discard(group_id)
+    return c.rowcount > 0
+
 def group_exists(group_id):
-    try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('SELECT 1 FROM groups WHERE group_id=?', (group_id,))
-        row = c.fetchone()
-        conn.close()
-        return bool(row)
-    except Exception as e:
-        logger.error(f"Error checking group {group_id}: {e}")
-        return False
+    return group_id in _known_groups
 
 def is_bypass_user(user_id):
-    try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('SELECT 1 FROM bypass_users WHERE user_id=?', (user_id,))
-        row = c.fetchone()
-        conn.close()
-        return bool(row)
-    except Exception as e:
-        logger.error(f"Error checking bypass for user {user_id}: {e}")
-        return False
+    return user_id in _bypass_users
 
 def add_bypass_user(user_id):
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_conn()
         c = conn.cursor()
         c.execute('INSERT OR IGNORE INTO bypass_users (user_id) VALUES (?)', (user_id,))
-        conn.commit()
-        conn.close()
+        _bypass_users.add(user_id)
         logger.info(f"User {user_id} added to bypass list.")
-    except Exception as e:
+    except sqlite3.Error as e:
         logger.error(f"Error adding user {user_id} to bypass list: {e}")
         raise
 
+def add_bypass_users(user_ids):
+    """ Bypass several users in one transaction. """
+    user_ids = list(user_ids)
+    try:
+        with _tx() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO bypass_users (user_id) VALUES (?)',
+                ((uid,) for uid in user_ids)
+            )
+        _bypass_users.update(user_ids)
+        logger.info(f"Added {len(user_ids)} user(s) to bypass list.")
+    except sqlite3.Error as e:
+        logger.error(f"Error adding users to bypass list: {e}")
+        raise
+
 def remove_bypass_user(user_id):
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_conn()
         c = conn.cursor()
         c.execute('DELETE FROM bypass_users WHERE user_id=?', (user_id,))
         changes = c.rowcount
-        conn.commit()
-        conn.close()
+        _bypass_users.discard(user_id)
         if changes > 0:
             logger.info(f"Removed user {user_id} from bypass list.")
             return True
         else:
             logger.warning(f"User {user_id} not found in bypass list.")
             return False
-    except Exception as e:
+    except sqlite3.Error as e:
         logger.error(f"Error removing user {user_id} from bypass list: {e}")
         return False
 
-def enable_deletion(group_id):
+def set_deletion(group_id, enabled):
+    """ Turn Arabic deletion on or off for a group with one upsert. """
+    state = "Enabled" if enabled else "Disabled"
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute(
-            "INSERT INTO deletion_settings (group_id, enabled) VALUES (?, 1) "
-            "ON CONFLICT(group_id) DO UPDATE SET enabled=1",
-            (group_id,)
-        )
-        conn.commit()
-        conn.close()
-        logger.info(f"Enabled Arabic deletion for group {group_id}.")
-    except Exception as e:
-        logger.error(f"Error enabling deletion for {group_id}: {e}")
-        raise
-
-def disable_deletion(group_id):
-    try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute(
-            "INSERT INTO deletion_settings (group_id, enabled) VALUES (?, 0) "
-            "ON CONFLICT(group_id) DO UPDATE SET enabled=0",
-            (group_id,)
-        )
-        conn.commit()
-        conn.close()
-        logger.info(f"Disabled Arabic deletion for group {group_id}.")
-    except Exception as e:
-        logger.error(f"Error disabling deletion for {group_id}: {e}")
+        conn = get_conn()
+        conn.execute(
+            "INSERT INTO deletion_settings (group_id, enabled) VALUES (?, ?) "
+            "ON CONFLICT(group_id) DO UPDATE SET enabled=excluded.enabled",
+            (group_id, int(enabled))
+        )
+        if enabled:
+            _deletion_enabled_groups.add(group_id)
+        else:
+            _deletion_enabled_groups.discard(group_id)
+        logger.info(f"{state} Arabic deletion for group {group_id}.")
+    except sqlite3.Error as e:
+        logger.error(f"Error setting deletion to {enabled} for {group_id}: {e}")
         raise
 
 def is_deletion_enabled(group_id):
-    try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('SELECT enabled FROM deletion_settings WHERE group_id=?', (group_id,))
-        row = c.fetchone()
-        conn.close()
-        return bool(row and row[0])
-    except Exception as e:
-        logger.error(f"Error checking deletion for {group_id}: {e}")
-        return False
+    return group_id in _deletion_enabled_groups
+
+def get_deletion_settings(group_id, user_id):
+    """ Return (deletion_enabled, is_bypassed); bypass is only queried when enabled. """
+    if group_id not in _deletion_enabled_groups:
+        return False, False
+    return True, is_bypass_user(user_id)
+
+def clear_user_records(group_id, user_id):
+    """ Drop a user's bypass, removed-user and permission records in one transaction. """
+    # Raw statements rather than the helpers: those log and swallow
+    # sqlite3.Error, which would let _tx commit the steps that did succeed.
+    with _tx() as conn:
+        conn.execute('DELETE FROM bypass_users WHERE user_id=?', (user_id,))
+        _bypass_users.discard(user_id)
+        conn.execute('DELETE FROM removed_users WHERE group_id=? AND user_id=?', (group_id, user_id))
+        conn.execute('UPDATE permissions SET role=? WHERE user_id=?', ('removed', user_id))
+    logger.info(f"Cleared bypass, removed-user and permission records for {user_id} in {group_id}.")
+
+def removed_user_ids(group_id):
+    return [row[0] for row in get_conn().execute(SQL_REMOVED_USER_IDS, (group_id,))]
 
 def revoke_user_permissions(user_id):
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_conn()
         c = conn.cursor()
         c.execute('UPDATE permissions SET role=? WHERE user_id=?', ('removed', user_id))
-        conn.commit()
-        conn.close()
         logger.info(f"Revoked permissions for user {user_id} (role='removed').")
-    except Exception as e:
+    except sqlite3.Error as e:
         logger.error(f"Error revoking perms for {user_id}: {e}")
         raise
 
 def remove_user_from_removed_users(group_id, user_id):
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_conn()
         c = conn.cursor()
         c.execute(
             'DELETE FROM removed_users WHERE group_id=? AND user_id=?',
             (group_id, user_id)
         )
         changes = c.rowcount
-        conn.commit()
-        conn.close()
         if changes > 0:
             logger.info(f"Removed user {user_id} from removed_users for group {group_id}.")
             return True
         else:
             logger.warning(f"User {user_id} not in removed_users for group {group_id}.")
             return False
-    except Exception as e:
+    except sqlite3.Error as e:
         logger.error(f"Error removing user {user_id} from removed_users: {e}")
         return False
 
+def remove_users_from_removed_users(pairs):
+    """ Delete many (group_id, user_id) pairs in one transaction; returns rows removed. """
+    try:
+        with _tx() as conn:
+            c = conn.executemany(
+                'DELETE FROM removed_users WHERE group_id=? AND user_id=?', pairs
+            )
+        logger.info(f"Removed {c.rowcount} entries from removed_users.")
+        return c.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Error removing entries from removed_users: {e}")
+        return 0
+
 def list_removed_users(group_id=None):
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_conn()
         c = conn.cursor()
         if group_id is None:
             c.execute("SELECT group_id, user_id, removal_reason, removal_time FROM removed_users")
@@ -333,24 +604,71 @@ def list_removed_users(group_id=None):
                 (group_id,)
             )
             rows = c.fetchall()
-        conn.close()
         logger.info("Fetched removed_users entries.")
         return rows
-    except Exception as e:
+    except sqlite3.Error as e:
         logger.error(f"Error fetching removed_users: {e}")
         return []
 
-# For short-term deletion of all messages (including service messages)
+# For short-term deletion of all messages (including service messages).
+# Maps group_id -> loop.time() deadline at which the flag is cleared.
 delete_all_messages_after_removal = {}
 
 # ------------------- Command Handlers -------------------
+def _plain(context, chat_id, text):
+    """
+    Send a reply as plain text. Dynamic replies carry no formatting, so this
+    skips both escape_markdown here and MarkdownV2 parsing on Telegram's side.
+    """
+    return context.bot.send_message(chat_id=chat_id, text=text)
+
+def send_in_background(context, chat_id, text):
+    """
+    Send a plain-text reply without awaiting it, for confirmations nothing
+    else depends on. PTB tracks the task and routes failures to the error
+    handler.
+    """
+    context.application.create_task(_plain(context, chat_id, text))
+
+def split_message(lines, limit=MAX_MESSAGE_LENGTH):
+    """ Join lines into as few messages as fit under Telegram's length limit. """
+    parts, current, size = [], [], 0
+    for line in lines:
+        # Breaks fall on line boundaries; only a line longer than the limit
+        # on its own is cut into limit-sized pieces.
+        while len(line) > limit:
+            if current:
+                parts.append("\n".join(current))
+                current, size = [], 0
+            parts.append(line[:limit])
+            line = line[limit:]
+        if current and size + len(line) + 1 > limit:
+            parts.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        parts.append("\n".join(current))
+    return parts
+
+def _parse_ints(context, n):
+    """ Parse the first n command args as integers; None if any is missing or invalid. """
+    try:
+        return tuple(int(context.args[i]) for i in range(n))
+    except (ValueError, IndexError):
+        return None
+
+def is_supergroup_id(chat_id):
+    """ Supergroup ids carry the -100 prefix; restrictions only work there. """
+    return chat_id <= -1000000000000
+
 async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if user.id != ALLOWED_USER_ID:
         return
     await context.bot.send_message(
         chat_id=user.id,
-        text=escape_markdown("✅ Bot is running.", version=2),
+        text=START_MD,
         parse_mode='MarkdownV2'
     )
 
@@ -358,97 +676,57 @@ async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if user.id != ALLOWED_USER_ID:
         return
-    help_text = (
-        "Available Commands:\n\n"
-        "• /start – Check if the bot is running.\n"
-        "• /help – Show help text.\n"
-        "• /group_add <group_id> – Register a group.\n"
-        "• /rmove_group <group_id> – Unregister a group.\n"
-        "• /bypass <user_id> – Add a user to bypass list.\n"
-        "• /unbypass <user_id> – Remove a user from bypass list.\n"
-        "• /love <group_id> <user_id> – Remove a user from 'Removed Users'.\n"
-        "• /back_group <group_id> <user_id> – Remove a user from 'Removed Users' without banning.\n"
-        "• /rmove_user <group_id> <user_id> – Force remove user from group.\n"
-        "• /mute <group_id> <user_id> <minutes> – Mute user.\n"
-        "• /unmute <group_id> <user_id> – Remove mute from user.\n"
-        "• /limit <group_id> <user_id> <permission_type> <on/off> – Toggle permission.\n"
-        "• /slow <group_id> <seconds> – Placeholder for slow mode.\n"
-        "• /be_sad <group_id> – Enable Arabic deletion.\n"
-        "• /be_happy <group_id> – Disable Arabic deletion.\n"
-        "• /check <group_id> – Validate 'Removed Users' vs actual membership.\n"
-        "• /link <group_id> – Create one-time invite link.\n"
-        "• /permission_type – Show valid <permission_type> for /limit.\n"
-        "• /get_id – Send this chat’s ID.\n\n"
-        "Note: The bot must be admin with 'can_restrict_members' to effectively mute/limit."
-    )
     await context.bot.send_message(
         chat_id=user.id,
-        text=escape_markdown(help_text, version=2),
+        text=HELP_MD,
         parse_mode='MarkdownV2'
     )
 
 async def group_add_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    global pending_group_id
     user = update.effective_user
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 1:
-        msg = "⚠️ Usage: /group_add <group_id>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2),
+            text=USAGE_MD["group_add"],
             parse_mode='MarkdownV2'
         )
-    try:
-        g_id = int(context.args[0])
-    except ValueError:
+    parsed = _parse_ints(context, 1)
+    if parsed is None:
         w = "⚠️ group_id must be integer."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(w, version=2),
-            parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, w)
+    g_id = parsed[0]
     if group_exists(g_id):
         wr = "⚠️ That group is already registered."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(wr, version=2),
-            parse_mode='MarkdownV2'
-        )
-    add_group(g_id)
-    pending_group_names[user.id] = g_id
+        return await _plain(context, user.id, wr)
+    await run_db(add_group, g_id)
+    pending_group_id = g_id
     confirm = f"✅ Group {g_id} added.\nNow send the group name in a message."
-    await context.bot.send_message(
-        chat_id=user.id,
-        text=escape_markdown(confirm, version=2),
-        parse_mode='MarkdownV2'
-    )
+    await _plain(context, user.id, confirm)
 
 async def handle_group_name_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    global pending_group_id
     user = update.effective_user
     if user.id != ALLOWED_USER_ID:
         return
-    if user.id not in pending_group_names:
+    if pending_group_id is None:
         return
     text = (update.message.text or "").strip()
     if not text:
         return
-    group_id = pending_group_names.pop(user.id)
+    group_id, pending_group_id = pending_group_id, None
     try:
-        set_group_name(group_id, text)
-        msg = f"✅ Group {group_id} name set to: {text}"
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(msg, version=2),
-            parse_mode='MarkdownV2'
-        )
+        if await run_db(set_group_name, group_id, text):
+            msg = f"✅ Group {group_id} name set to: {text}"
+        else:
+            msg = f"⚠️ Group {group_id} is no longer registered; name not set."
+        await _plain(context, user.id, msg)
     except Exception as e:
         logger.error(f"Error setting group name for {group_id}: {e}")
         err = "⚠️ Could not set group name. Check logs."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(err, version=2),
-            parse_mode='MarkdownV2'
-        )
+        await _plain(context, user.id, err)
 
 # New /get_id command
 async def get_id_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -456,11 +734,7 @@ async def get_id_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user.id != ALLOWED_USER_ID:
         return
     chat_id = update.effective_chat.id
-    await context.bot.send_message(
-        chat_id=user.id,
-        text=escape_markdown(str(chat_id), version=2),
-        parse_mode='MarkdownV2'
-    )
+    await _plain(context, user.id, str(chat_id))
 
 # New /back_group command
 async def back_group_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -469,165 +743,101 @@ async def back_group_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 2:
-        msg = "⚠️ Usage: /back_group <group_id> <user_id>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2),
+            text=USAGE_MD["back_group"],
             parse_mode='MarkdownV2'
         )
-    try:
-        g_id = int(context.args[0])
-        u_id = int(context.args[1])
-    except ValueError:
+    parsed = _parse_ints(context, 2)
+    if parsed is None:
         err = "⚠️ Both group_id and user_id must be integers."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(err, version=2),
-            parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, err)
+    g_id, u_id = parsed
     if not group_exists(g_id):
         wr = f"⚠️ Group {g_id} is not registered."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(wr, version=2),
-            parse_mode='MarkdownV2'
-        )
-    removed = remove_user_from_removed_users(g_id, u_id)
+        return await _plain(context, user.id, wr)
+    removed = await run_db(remove_user_from_removed_users, g_id, u_id)
     if removed:
         cf = f"✅ User {u_id} removed from 'Removed Users' list for group {g_id}."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(cf, version=2),
-            parse_mode='MarkdownV2'
-        )
+        await _plain(context, user.id, cf)
     else:
         wr = f"⚠️ User {u_id} not found in 'Removed Users' for group {g_id}."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(wr, version=2),
-            parse_mode='MarkdownV2'
-        )
+        await _plain(context, user.id, wr)
 
 async def rmove_group_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 1:
-        msg = "⚠️ Usage: /rmove_group <group_id>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2),
+            text=USAGE_MD["rmove_group"],
             parse_mode='MarkdownV2'
         )
-    try:
-        g_id = int(context.args[0])
-    except ValueError:
+    parsed = _parse_ints(context, 1)
+    if parsed is None:
         w = "⚠️ group_id must be integer."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(w, version=2),
-            parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, w)
+    g_id = parsed[0]
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('DELETE FROM groups WHERE group_id=?', (g_id,))
-        changes = c.rowcount
-        conn.commit()
-        conn.close()
-        if changes > 0:
+        if await run_db(remove_group, g_id):
             cf = f"✅ Group `{g_id}` removed."
-            await context.bot.send_message(
-                chat_id=user.id,
-                text=escape_markdown(cf, version=2),
-                parse_mode='MarkdownV2'
-            )
+            await _plain(context, user.id, cf)
         else:
             wr = f"⚠️ Group `{g_id}` not found."
-            await context.bot.send_message(
-                chat_id=user.id,
-                text=escape_markdown(wr, version=2),
-                parse_mode='MarkdownV2'
-            )
+            await _plain(context, user.id, wr)
     except Exception as e:
         logger.error(f"Error removing group {g_id}: {e}")
         msg = "⚠️ Could not remove group. Check logs."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(msg, version=2),
-            parse_mode='MarkdownV2'
-        )
+        await _plain(context, user.id, msg)
 
 async def bypass_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 1:
-        msg = "⚠️ Usage: /bypass <user_id>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
+            text=USAGE_MD["bypass"], parse_mode='MarkdownV2'
         )
-    try:
-        uid = int(context.args[0])
-    except ValueError:
+    parsed = _parse_ints(context, 1)
+    if parsed is None:
         wr = "⚠️ user_id must be integer."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(wr, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, wr)
+    uid = parsed[0]
     if is_bypass_user(uid):
         wr = f"⚠️ User {uid} is already bypassed."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(wr, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, wr)
     try:
-        add_bypass_user(uid)
-        cf = f"✅ User {uid} added to bypass list."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(cf, version=2), parse_mode='MarkdownV2'
-        )
+        await run_db(add_bypass_user, uid)
     except Exception as e:
         logger.error(f"Error bypassing {uid}: {e}")
         err = "⚠️ Could not bypass user. Check logs."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(err, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, err)
+    cf = f"✅ User {uid} added to bypass list."
+    send_in_background(context, user.id, cf)
 
 async def unbypass_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 1:
-        msg = "⚠️ Usage: /unbypass <user_id>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
+            text=USAGE_MD["unbypass"], parse_mode='MarkdownV2'
         )
-    try:
-        uid = int(context.args[0])
-    except ValueError:
+    parsed = _parse_ints(context, 1)
+    if parsed is None:
         wr = "⚠️ user_id must be integer."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(wr, version=2), parse_mode='MarkdownV2'
-        )
-    removed = remove_bypass_user(uid)
+        return await _plain(context, user.id, wr)
+    uid = parsed[0]
+    removed = await run_db(remove_bypass_user, uid)
     if removed:
         cf = f"✅ User {uid} removed from bypass list."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(cf, version=2), parse_mode='MarkdownV2'
-        )
+        send_in_background(context, user.id, cf)
     else:
         wr = f"⚠️ User {uid} not found in bypass list."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(wr, version=2), parse_mode='MarkdownV2'
-        )
+        send_in_background(context, user.id, wr)
 
 async def love_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """ /love <group_id> <user_id> """
@@ -635,42 +845,28 @@ async def love_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 2:
-        msg = "⚠️ Usage: /love <group_id> <user_id>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
+            text=USAGE_MD["love"], parse_mode='MarkdownV2'
         )
-    try:
-        g_id = int(context.args[0])
-        u_id = int(context.args[1])
-    except ValueError:
+    parsed = _parse_ints(context, 2)
+    if parsed is None:
         e = "⚠️ Both group_id and user_id must be integers."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(e, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, e)
+    g_id, u_id = parsed
     if not group_exists(g_id):
         wr = f"⚠️ Group {g_id} is not registered."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(wr, version=2), parse_mode='MarkdownV2'
-        )
-    removed = remove_user_from_removed_users(g_id, u_id)
+        return await _plain(context, user.id, wr)
+    removed = await run_db(remove_user_from_removed_users, g_id, u_id)
     if not removed:
         wr = f"⚠️ User {u_id} is not in 'Removed Users' for group {g_id}."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(wr, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, wr)
     try:
-        revoke_user_permissions(u_id)
+        await run_db(revoke_user_permissions, u_id)
     except Exception as e:
         logger.error(f"Error revoking perms for {u_id}: {e}")
     cf = f"✅ Loved user {u_id} (removed from 'Removed Users') in group {g_id}."
-    await context.bot.send_message(
-        chat_id=user.id,
-        text=escape_markdown(cf, version=2), parse_mode='MarkdownV2'
-    )
+    await _plain(context, user.id, cf)
 
 async def rmove_user_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """ /rmove_user <group_id> <user_id> """
@@ -678,46 +874,33 @@ async def rmove_user_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 2:
-        msg = "⚠️ Usage: /rmove_user <group_id> <user_id>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
+            text=USAGE_MD["rmove_user"], parse_mode='MarkdownV2'
         )
-    try:
-        g_id = int(context.args[0])
-        u_id = int(context.args[1])
-    except ValueError:
+    parsed = _parse_ints(context, 2)
+    if parsed is None:
         e = "⚠️ Both group_id and user_id must be integers."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(e, version=2), parse_mode='MarkdownV2'
-        )
-    remove_bypass_user(u_id)
-    remove_user_from_removed_users(g_id, u_id)
+        return await _plain(context, user.id, e)
+    g_id, u_id = parsed
+    # One transaction, so the three writes share a single commit.
     try:
-        revoke_user_permissions(u_id)
+        await run_db(clear_user_records, g_id, u_id)
     except Exception as e:
         logger.error(f"Revoke perms failed for {u_id}: {e}")
     try:
         await context.bot.ban_chat_member(chat_id=g_id, user_id=u_id)
     except Exception as e:
         err = f"⚠️ Could not ban {u_id} from group {g_id} (check bot perms)."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(err, version=2), parse_mode='MarkdownV2'
-        )
+        await _plain(context, user.id, err)
         logger.error(f"Ban error for {u_id} in {g_id}: {e}")
         return
-    delete_all_messages_after_removal[g_id] = datetime.utcnow() + timedelta(seconds=MESSAGE_DELETE_TIMEFRAME)
-    asyncio.create_task(remove_deletion_flag_after_timeout(g_id))
+    flag_group_for_deletion(g_id)
     cf = (
         f"✅ Removed {u_id} from group {g_id}.\n"
         f"Messages for next {MESSAGE_DELETE_TIMEFRAME} seconds will be deleted."
     )
-    await context.bot.send_message(
-        chat_id=user.id,
-        text=escape_markdown(cf, version=2), parse_mode='MarkdownV2'
-    )
+    await _plain(context, user.id, cf)
 
 async def mute_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """ /mute <group_id> <user_id> <minutes> """
@@ -725,29 +908,26 @@ async def mute_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 3:
-        msg = "⚠️ Usage: /mute <group_id> <user_id> <minutes>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
+            text=USAGE_MD["mute"], parse_mode='MarkdownV2'
         )
-    try:
-        g_id = int(context.args[0])
-        u_id = int(context.args[1])
-        minutes = int(context.args[2])
-    except ValueError:
+    parsed = _parse_ints(context, 3)
+    if parsed is None:
         w = "⚠️ group_id, user_id, & minutes must be integers."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(w, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, w)
+    g_id, u_id, minutes = parsed
     if not group_exists(g_id):
         ef = f"⚠️ Group {g_id} not registered."
+        return await _plain(context, user.id, ef)
+    if not is_supergroup_id(g_id):
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(ef, version=2), parse_mode='MarkdownV2'
+            text=SUPERGROUP_ONLY_MD, parse_mode='MarkdownV2'
         )
-    until_date = datetime.utcnow() + timedelta(minutes=minutes)
-    perms = ChatPermissions(can_send_messages=False)
+    # The Bot API takes a unix timestamp directly.
+    until_date = int(time.time()) + minutes * 60
+    perms = PERMISSIONS_MUTED
     try:
         await context.bot.restrict_chat_member(
             chat_id=g_id,
@@ -756,17 +936,11 @@ async def mute_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
             until_date=until_date
         )
         cf = f"✅ Muted user {u_id} in group {g_id} for {minutes} minute(s)."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(cf, version=2), parse_mode='MarkdownV2'
-        )
+        await _plain(context, user.id, cf)
     except Exception as e:
         logger.error(f"Error muting user {u_id} in {g_id}: {e}")
         err = "⚠️ Could not mute. Bot must be admin with can_restrict_members."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(err, version=2), parse_mode='MarkdownV2'
-        )
+        await _plain(context, user.id, err)
 
 async def unmute_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """ /unmute <group_id> <user_id> """
@@ -774,57 +948,35 @@ async def unmute_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 2:
-        msg = "⚠️ Usage: /unmute <group_id> <user_id>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
+            text=USAGE_MD["unmute"], parse_mode='MarkdownV2'
         )
-    try:
-        g_id = int(context.args[0])
-        u_id = int(context.args[1])
-    except ValueError:
+    parsed = _parse_ints(context, 2)
+    if parsed is None:
         w = "⚠️ group_id, user_id must be integers."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(w, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, w)
+    g_id, u_id = parsed
     if not group_exists(g_id):
         ef = f"⚠️ Group {g_id} is not registered."
+        return await _plain(context, user.id, ef)
+    if not is_supergroup_id(g_id):
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(ef, version=2), parse_mode='MarkdownV2'
+            text=SUPERGROUP_ONLY_MD, parse_mode='MarkdownV2'
         )
-    perms = ChatPermissions(
-        can_send_messages=True,
-        can_send_media_messages=True,
-        can_send_polls=True,
-        can_send_other_messages=True,
-        can_add_web_page_previews=True
-    )
     try:
         await context.bot.restrict_chat_member(
             chat_id=g_id,
             user_id=u_id,
-            permissions=perms
+            permissions=PERMISSIONS_ALL
         )
         cf = f"✅ Unmuted user {u_id} in group {g_id}."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(cf, version=2), parse_mode='MarkdownV2'
-        )
+        await _plain(context, user.id, cf)
     except Exception as e:
         logger.error(f"Error unmuting user {u_id} in group {g_id}: {e}")
         err = "⚠️ Could not unmute. Bot must be admin with can_restrict_members."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(err, version=2), parse_mode='MarkdownV2'
-        )
-
-VALID_PERMISSION_TYPES = [
-    "text", "photos", "videos", "files", "music",
-    "gifs", "voice", "video_messages", "inlinebots",
-    "embed_links", "polls", "stickers", "games"
-]
+        await _plain(context, user.id, err)
 
 async def limit_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """ /limit <group_id> <user_id> <permission_type> <on/off> """
@@ -832,55 +984,32 @@ async def limit_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 4:
-        msg = (
-            "⚠️ Usage: /limit <group_id> <user_id> <permission_type> <on/off>\n"
-            "Valid types: " + ", ".join(VALID_PERMISSION_TYPES)
-        )
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
+            text=USAGE_MD["limit"], parse_mode='MarkdownV2'
         )
-    try:
-        g_id = int(context.args[0])
-        u_id = int(context.args[1])
-        p_type = context.args[2].lower().strip()
-        toggle = context.args[3].lower().strip()
-    except ValueError:
+    parsed = _parse_ints(context, 2)
+    if parsed is None:
         wr = "⚠️ Invalid arguments."
+        return await _plain(context, user.id, wr)
+    g_id, u_id = parsed
+    p_type = context.args[2].lower().strip()
+    toggle = context.args[3].lower().strip()
+    if not group_exists(g_id):
+        w = f"⚠️ Group {g_id} not registered."
+        return await _plain(context, user.id, w)
+    if not is_supergroup_id(g_id):
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(wr, version=2), parse_mode='MarkdownV2'
+            text=SUPERGROUP_ONLY_MD, parse_mode='MarkdownV2'
         )
-    if not group_exists(g_id):
-        w = f"⚠️ Group {g_id} not registered."
+    field = PERMISSION_FIELDS.get(p_type)
+    if field is None:
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(w, version=2), parse_mode='MarkdownV2'
+            text=UNKNOWN_PERMISSION_MD, parse_mode='MarkdownV2'
         )
-    perms_kwargs = {
-        "can_send_messages": True,
-        "can_send_media_messages": True,
-        "can_send_polls": True,
-        "can_send_other_messages": True,
-        "can_add_web_page_previews": True
-    }
-    off = (toggle == "off")
-    if p_type == "text" and off:
-        perms_kwargs["can_send_messages"] = False
-    elif p_type in ["photos", "videos", "files", "music", "gifs", "voice", "video_messages", "inlinebots", "embed_links"] and off:
-        perms_kwargs["can_send_media_messages"] = False
-    elif p_type == "polls" and off:
-        perms_kwargs["can_send_polls"] = False
-    elif p_type in ["stickers", "games"] and off:
-        perms_kwargs["can_send_other_messages"] = False
-    else:
-        if p_type not in VALID_PERMISSION_TYPES:
-            wr = "⚠️ Unknown permission_type."
-            return await context.bot.send_message(
-                chat_id=user.id,
-                text=escape_markdown(wr, version=2), parse_mode='MarkdownV2'
-            )
-    perms = ChatPermissions(**perms_kwargs)
+    perms = PERMISSIONS_WITHOUT[field] if toggle == "off" else PERMISSIONS_ALL
     try:
         await context.bot.restrict_chat_member(
             chat_id=g_id,
@@ -888,63 +1017,274 @@ async def limit_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
             permissions=perms
         )
         msg = f"✅ Set '{p_type}' to '{toggle}' for {u_id} in {g_id}."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
-        )
+        await _plain(context, user.id, msg)
     except Exception as e:
         logger.error(f"Error limiting perms for {u_id} in {g_id}: {e}")
         err = "⚠️ Could not limit permission."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(err, version=2), parse_mode='MarkdownV2'
-        )
+        await _plain(context, user.id, err)
 
 async def slow_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 2:
-        msg = "⚠️ Usage: /slow <group_id> <delay_in_seconds>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
+            text=USAGE_MD["slow"], parse_mode='MarkdownV2'
         )
-    try:
-        g_id = int(context.args[0])
-        delay = int(context.args[1])
-    except ValueError:
+    parsed = _parse_ints(context, 2)
+    if parsed is None:
         w = "⚠️ group_id & delay must be integers."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(w, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, w)
+    g_id, delay = parsed
     if not group_exists(g_id):
         e = f"⚠️ Group {g_id} not registered."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(e, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, e)
     note = "⚠️ No official method to set slow mode. (Placeholder only.)"
-    await context.bot.send_message(
-        chat_id=user.id,
-        text=escape_markdown(note, version=2), parse_mode='MarkdownV2'
-    )
+    await _plain(context, user.id, note)
 
 async def permission_type_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if user.id != ALLOWED_USER_ID:
         return
-    types_list = "\n".join(f"• {ptype}" for ptype in VALID_PERMISSION_TYPES)
-    message = "Possible permission_type values:\n\n" + types_list
     await context.bot.send_message(
         chat_id=user.id,
-        text=escape_markdown(message, version=2), parse_mode='MarkdownV2'
+        text=PERMISSION_TYPES_MD, parse_mode='MarkdownV2'
     )
 
 # ------------------- Deletion / Filtering Handlers -------------------
-def has_arabic(text):
-    return bool(re.search(r'[\u0600-\u06FF]', text))
+def pdf_page_texts(data):
+    """ Yield the text of each page of an in-memory PDF. """
+    if fitz is not None:
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            for page in doc:
+                yield page.get_text("text")
+    else:
+        for page in PdfReader(io.BytesIO(data)).pages:
+            yield page.extract_text() or ""
+
+# PDF parsing and OCR are CPU-bound; run them in worker processes so the
+# event loop keeps serving updates. Workers only receive the downloaded
+# bytearray (pickled as-is, without an extra copy on the loop) and return a
+# bool, so no Telegram objects cross the process boundary.
+def pdf_has_arabic(data):
+    pages = itertools.islice(pdf_page_texts(data), MAX_PDF_PAGES)
+    return any(is_arabic(text) for text in pages)
+
+_OCR_LUT = [255 if p > OCR_THRESHOLD else 0 for p in range(256)]
+
+def preprocess_for_ocr(img):
+    """
+    Grayscale, bound the width and binarize so Tesseract has less to do.
+    Returns None for images too small or too flat to carry legible text.
+    """
+    # For JPEGs (all Telegram photos) this makes the decoder itself emit
+    # grayscale at a reduced scale, instead of decoding full colour first.
+    img.draft('L', (OCR_MAX_WIDTH, OCR_MAX_WIDTH))
+    img = img.convert('L')
+    w, h = img.size
+    if min(w, h) < OCR_MIN_SIDE:
+        return None
+    # Text needs contrast; a thumbnail's spread is a cheap proxy for it.
+    if ImageStat.Stat(img.resize((64, 64))).stddev[0] < OCR_MIN_STDDEV:
+        return None
+    if w > OCR_MAX_WIDTH:
+        img = img.resize((OCR_MAX_WIDTH, h * OCR_MAX_WIDTH // w), Image.Resampling.BILINEAR)
+    return img.point(_OCR_LUT, mode='1')
+
+# One Tesseract instance per worker process, created on first use.
+_tess_api = None
+# A second instance for script detection: OSD needs the osd model and an
+# OSD page-segmentation mode, which the OCR instance doesn't have.
+_osd_api = None
+
+def _get_tess_api():
+    global _tess_api
+    if _tess_api is None:
+        _tess_api = PyTessBaseAPI(lang=OCR_LANG)
+    return _tess_api
+
+def _get_osd_api():
+    global _osd_api
+    if _osd_api is None:
+        _osd_api = PyTessBaseAPI(lang='osd', psm=PSM.OSD_ONLY)
+    return _osd_api
+
+def ocr_image(img):
+    if tesserocr_available:
+        api = _get_tess_api()
+        api.SetImage(img)
+        return api.GetUTF8Text()
+    return image_to_string(img, lang=OCR_LANG)
+
+def detect_script(img):
+    """
+    Return (script_name, confidence) from Tesseract's OSD pass, or None.
+    Only used with tesserocr: under pytesseract OSD costs a tesseract process
+    per image, more than the batched OCR pass it would be trying to avoid.
+    """
+    try:
+        api = _get_osd_api()
+        api.SetImage(img)
+        info = api.DetectOrientationScript()
+        return (info['script_name'], info['script_conf']) if info else None
+    except Exception:
+        # OSD fails on images with too little text; let full OCR decide.
+        return None
+
+def ocr_images_via_list(imgs):
+    """
+    OCR several images with a single tesseract process by handing it a list
+    file; pytesseract otherwise pays process start-up and model load per image.
+    Returns one text per image.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i, img in enumerate(imgs):
+            path = os.path.join(tmp, f"{i}.png")
+            img.save(path)
+            paths.append(path)
+        list_path = os.path.join(tmp, "images.txt")
+        with open(list_path, 'w') as f:
+            f.write("\n".join(paths) + "\n")
+        # Tesseract ends each page's text with a form feed.
+        pages = image_to_string(list_path, lang=OCR_LANG).split('\x0c')
+    return pages[:len(imgs)] + [""] * (len(imgs) - len(pages))
+
+def images_have_arabic(images):
+    """
+    OCR a batch of images in one worker call, reusing its Tesseract session.
+    An image whose OCR failed gets None rather than False, so it isn't cached as clean.
+    """
+    results = [False] * len(images)
+    undecided = []
+    for i, data in enumerate(images):
+        try:
+            img = preprocess_for_ocr(Image.open(io.BytesIO(data)))
+            if img is None:
+                continue
+            script = detect_script(img) if tesserocr_available else None
+            if script and script[1] >= OSD_MIN_SCRIPT_CONF:
+                results[i] = script[0] == 'Arabic'
+            else:
+                undecided.append((i, img))
+        except Exception as e:
+            results[i] = None
+            logger.error(f"OCR error: {e}")
+    # Images OSD couldn't classify get a full OCR pass.
+    if tesserocr_available:
+        for i, img in undecided:
+            try:
+                results[i] = is_arabic(ocr_image(img) or "")
+            except Exception as e:
+                results[i] = None
+                logger.error(f"OCR error: {e}")
+    elif undecided:
+        try:
+            texts = ocr_images_via_list([img for _, img in undecided])
+            for (i, _), text in zip(undecided, texts):
+                results[i] = is_arabic(text)
+        except Exception as e:
+            for i, _ in undecided:
+                results[i] = None
+            logger.error(f"OCR error: {e}")
+    return results
+
+def _init_ocr_worker():
+    # Tesseract's OpenMP threading oversubscribes cores when several OCR
+    # jobs run at once; parallelism comes from the pool workers instead.
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    # Load the language model as the worker starts, not on its first photo.
+    if tesserocr_available:
+        _get_tess_api()
+        _get_osd_api()
+
+OCR_WORKERS = os.cpu_count() or 1
+# Created by start_ocr_pool() when the bot starts.
+OCR_POOL = None
+
+def start_ocr_pool():
+    """ Create the OCR pool and start its workers up front, so early photos skip process and model start-up. """
+    global OCR_POOL
+    # forkserver workers start from a fresh interpreter rather than a fork of
+    # this process, so they never inherit the lock file, the SQLite
+    # connection, its atexit hook or PTB's threads.
+    OCR_POOL = ProcessPoolExecutor(
+        max_workers=OCR_WORKERS,
+        initializer=_init_ocr_worker,
+        mp_context=multiprocessing.get_context('forkserver')
+    )
+    for _ in range(OCR_WORKERS):
+        OCR_POOL.submit(os.getpid)
+
+# Photos arriving close together are collected into one pool submission.
+_ocr_queue = asyncio.Queue()
+_ocr_consumer_task = None
+_ocr_batch_tasks = set()
+
+async def ocr_has_arabic(data):
+    """ Queue an image for batched OCR and wait for its result. """
+    global _ocr_consumer_task
+    if _ocr_consumer_task is None:
+        _ocr_consumer_task = asyncio.create_task(_ocr_consumer())
+    fut = asyncio.get_running_loop().create_future()
+    await _ocr_queue.put((data, fut))
+    return await fut
+
+async def _ocr_consumer():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _ocr_queue.get()]
+        deadline = loop.time() + OCR_BATCH_WINDOW
+        while len(batch) < OCR_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_ocr_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        task = asyncio.create_task(_run_ocr_batch(batch))
+        _ocr_batch_tasks.add(task)
+        task.add_done_callback(_ocr_batch_tasks.discard)
+
+async def _run_ocr_batch(batch):
+    loop = asyncio.get_running_loop()
+    try:
+        results = await loop.run_in_executor(OCR_POOL, images_have_arabic, [data for data, _ in batch])
+    except Exception as e:
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_exception(e)
+        return
+    for (_, fut), found in zip(batch, results):
+        if not fut.done():
+            fut.set_result(found)
+
+async def pooled_pdf_has_arabic(data):
+    return await asyncio.get_running_loop().run_in_executor(OCR_POOL, pdf_has_arabic, data)
+
+# Forwards of the same file keep its file_unique_id, so each distinct PDF or
+# photo is downloaded and scanned once. Least recently used entries go first.
+_file_verdicts = OrderedDict()
+
+async def file_has_arabic(context, file_obj, check):
+    """
+    Download a Telegram file and run the async check on its bytes, caching the verdict.
+    A check that returns None (it failed) is not cached, so the next copy is scanned again.
+    """
+    uid = file_obj.file_unique_id
+    found = _file_verdicts.get(uid)
+    if found is not None:
+        _file_verdicts.move_to_end(uid)
+        return found
+    file_ref = await context.bot.get_file(file_obj.file_id)
+    found = await check(await file_ref.download_as_bytearray())
+    if found is not None:
+        _file_verdicts[uid] = found
+        if len(_file_verdicts) > FILE_VERDICT_CACHE_SIZE:
+            _file_verdicts.popitem(last=False)
+    return found
 
 async def delete_arabic_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message
@@ -952,61 +1292,48 @@ async def delete_arabic_messages(update: Update, context: ContextTypes.DEFAULT_T
         return
     user = msg.from_user
     chat_id = msg.chat.id
-    if not is_deletion_enabled(chat_id):
-        return
-    if is_bypass_user(user.id):
+    enabled, bypassed = get_deletion_settings(chat_id, user.id)
+    if not enabled or bypassed:
         return
     text_or_caption = (msg.text or msg.caption or "")
-    if text_or_caption and has_arabic(text_or_caption):
+    if text_or_caption and is_arabic(text_or_caption):
         try:
             await msg.delete()
             logger.info(f"Deleted Arabic text from {user.id} in group {chat_id}.")
         except Exception as e:
             logger.error(f"Error deleting Arabic message: {e}")
         return
-    if msg.document and msg.document.file_name and msg.document.file_name.lower().endswith('.pdf'):
-        if pdf_available:
-            file_id = msg.document.file_id
-            file_ref = await context.bot.get_file(file_id)
-            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_pdf:
-                await file_ref.download_to_drive(tmp_pdf.name)
-                tmp_pdf.flush()
+    # Only the 4-char suffix is lowercased, not the whole file name.
+    if msg.document and msg.document.file_name and msg.document.file_name[-4:].lower() == '.pdf':
+        # Files over the getFile limit can't be fetched; skip the doomed API call.
+        if pdf_available and (msg.document.file_size or 0) <= MAX_DOWNLOAD_SIZE:
             try:
-                with open(tmp_pdf.name, 'rb') as pdf_file:
-                    reader = PyPDF2.PdfReader(pdf_file)
-                    all_text = ""
-                    for page in reader.pages:
-                        all_text += page.extract_text() or ""
-                    if has_arabic(all_text):
-                        await msg.delete()
-                        logger.info(f"Deleted PDF with Arabic from user {user.id} in {chat_id}.")
+                # Re-checked after the download and scan, which can take a while:
+                # deletion may have been switched off in the meantime.
+                if (await file_has_arabic(context, msg.document, pooled_pdf_has_arabic)
+                        and is_deletion_enabled(chat_id)):
+                    await msg.delete()
+                    logger.info(f"Deleted PDF with Arabic from user {user.id} in {chat_id}.")
             except Exception as e:
                 logger.error(f"PDF processing error: {e}")
-            finally:
-                try:
-                    os.remove(tmp_pdf.name)
-                except:
-                    pass
     if msg.photo:
-        if pytesseract_available and pillow_available:
-            photo_obj = msg.photo[-1]
-            file_id = photo_obj.file_id
-            file_ref = await context.bot.get_file(file_id)
-            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp_img:
-                await file_ref.download_to_drive(tmp_img.name)
-                tmp_img.flush()
+        if ocr_available:
+            # Sizes are listed smallest first; the original resolution is more
+            # than presence detection needs and costs more to download and decode.
+            photo_obj = next(
+                (p for p in msg.photo if max(p.width, p.height) >= OCR_PHOTO_MIN_SIDE),
+                msg.photo[-1]
+            )
+            # Thumbnails too small to hold legible text aren't worth downloading.
+            if min(photo_obj.width, photo_obj.height) < OCR_MIN_SIDE:
+                return
             try:
-                extracted = pytesseract.image_to_string(Image.open(tmp_img.name)) or ""
-                if has_arabic(extracted):
+                if (await file_has_arabic(context, photo_obj, ocr_has_arabic)
+                        and is_deletion_enabled(chat_id)):
                     await msg.delete()
                     logger.info(f"Deleted image with Arabic from {user.id} in {chat_id}.")
             except Exception as e:
                 logger.error(f"OCR error: {e}")
-            finally:
-                try:
-                    os.remove(tmp_img.name)
-                except:
-                    pass
 
 async def delete_any_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message
@@ -1014,25 +1341,71 @@ async def delete_any_messages(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     chat_id = msg.chat.id
     if chat_id in delete_all_messages_after_removal:
-        expiry = delete_all_messages_after_removal[chat_id]
-        if datetime.utcnow() > expiry:
-            delete_all_messages_after_removal.pop(chat_id, None)
-            logger.info(f"Short-term deletion expired for {chat_id}.")
-            return
         try:
             await msg.delete()
             logger.info(f"Deleted a message in group {chat_id} (short-term).")
+            return True
         except Exception as e:
             logger.error(f"Failed to delete flagged message in {chat_id}: {e}")
 
+async def route_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Single entry point for non-command messages. PTB only runs the first
+    matching handler per group, so the per-purpose handlers are dispatched
+    from here instead of being registered separately.
+    """
+    msg = update.message
+    if not msg:
+        return
+    if msg.chat.id in delete_all_messages_after_removal:
+        if await delete_any_messages(update, context):
+            return
+    if msg.text or msg.caption or msg.document or msg.photo:
+        await delete_arabic_messages(update, context)
+    if msg.text and not msg.text.startswith('/'):
+        await handle_group_name_reply(update, context)
+
+class RoutableMessage(filters.MessageFilter):
+    """
+    Passes only messages route_message could act on: chats in the
+    post-removal window, chats with Arabic deletion on, or the admin while a
+    group name is pending. Everything else is rejected by set lookups before
+    PTB creates a handler task.
+    """
+    def filter(self, message):
+        chat_id = message.chat.id
+        if chat_id in delete_all_messages_after_removal or chat_id in _deletion_enabled_groups:
+            return True
+        return (
+            pending_group_id is not None
+            and message.from_user is not None
+            and message.from_user.id == ALLOWED_USER_ID
+        )
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.error("Error in the bot:", exc_info=context.error)
 
-async def remove_deletion_flag_after_timeout(group_id):
-    await asyncio.sleep(MESSAGE_DELETE_TIMEFRAME)
-    if group_id in delete_all_messages_after_removal:
-        delete_all_messages_after_removal.pop(group_id, None)
-        logger.info(f"Deletion flag removed for group {group_id}")
+def flag_group_for_deletion(group_id):
+    """ Delete every message in the group for the next MESSAGE_DELETE_TIMEFRAME seconds. """
+    loop = asyncio.get_running_loop()
+    armed = group_id in delete_all_messages_after_removal
+    delete_all_messages_after_removal[group_id] = loop.time() + MESSAGE_DELETE_TIMEFRAME
+    # One timer per flagged group: a repeat removal only pushes the deadline
+    # back and the pending timer re-arms itself, rather than cancelling and
+    # leaving a dead handle in the loop's timer heap.
+    if not armed:
+        loop.call_later(MESSAGE_DELETE_TIMEFRAME, remove_deletion_flag, group_id)
+
+def remove_deletion_flag(group_id):
+    deadline = delete_all_messages_after_removal.get(group_id)
+    if deadline is None:
+        return
+    loop = asyncio.get_running_loop()
+    if loop.time() < deadline:
+        loop.call_at(deadline, remove_deletion_flag, group_id)
+        return
+    del delete_all_messages_after_removal[group_id]
+    logger.info(f"Deletion flag removed for group {group_id}")
 
 # ------------------- /be_sad, /be_happy, /check, /link -------------------
 async def be_sad_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1040,167 +1413,145 @@ async def be_sad_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 1:
-        msg = "⚠️ Usage: /be_sad <group_id>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
+            text=USAGE_MD["be_sad"], parse_mode='MarkdownV2'
         )
-    try:
-        g_id = int(context.args[0])
-    except ValueError:
+    parsed = _parse_ints(context, 1)
+    if parsed is None:
         w = "⚠️ group_id must be integer."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(w, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, w)
+    g_id = parsed[0]
+    if not group_exists(g_id):
+        wr = f"⚠️ Group {g_id} is not registered."
+        return await _plain(context, user.id, wr)
     try:
-        enable_deletion(g_id)
-        cf = f"✅ Arabic deletion enabled for group {g_id}."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(cf, version=2), parse_mode='MarkdownV2'
-        )
+        await run_db(set_deletion, g_id, True)
     except Exception as e:
         logger.error(f"Error enabling deletion for {g_id}: {e}")
         er = "⚠️ Could not enable. Check logs."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(er, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, er)
+    cf = f"✅ Arabic deletion enabled for group {g_id}."
+    send_in_background(context, user.id, cf)
 
 async def be_happy_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 1:
-        msg = "⚠️ Usage: /be_happy <group_id>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
+            text=USAGE_MD["be_happy"], parse_mode='MarkdownV2'
         )
-    try:
-        g_id = int(context.args[0])
-    except ValueError:
+    parsed = _parse_ints(context, 1)
+    if parsed is None:
         w = "⚠️ group_id must be integer."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(w, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, w)
+    g_id = parsed[0]
+    if not group_exists(g_id):
+        wr = f"⚠️ Group {g_id} is not registered."
+        return await _plain(context, user.id, wr)
     try:
-        disable_deletion(g_id)
-        cf = f"✅ Arabic deletion disabled for group {g_id}."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(cf, version=2), parse_mode='MarkdownV2'
-        )
+        await run_db(set_deletion, g_id, False)
     except Exception as e:
         logger.error(f"Error disabling deletion for {g_id}: {e}")
         err = "⚠️ Could not disable. Check logs."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(err, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, err)
+    cf = f"✅ Arabic deletion disabled for group {g_id}."
+    send_in_background(context, user.id, cf)
 
 async def check_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 1:
-        msg = "⚠️ Usage: /check <group_id>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
+            text=USAGE_MD["check"], parse_mode='MarkdownV2'
         )
-    try:
-        g_id = int(context.args[0])
-    except ValueError:
+    parsed = _parse_ints(context, 1)
+    if parsed is None:
         wr = "⚠️ group_id must be integer."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(wr, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, wr)
+    g_id = parsed[0]
     if not group_exists(g_id):
         ef = f"⚠️ Group {g_id} is not registered."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(ef, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, ef)
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('SELECT user_id FROM removed_users WHERE group_id=?', (g_id,))
-        removed_list = [row[0] for row in c.fetchall()]
-        conn.close()
+        removed_list = await run_db(removed_user_ids, g_id)
     except Exception as e:
         logger.error(f"Error listing removed users for {g_id}: {e}")
         e2 = "⚠️ DB error. Check logs."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(e2, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, e2)
     if not removed_list:
         msg = f"⚠️ No removed users found for group {g_id}."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, msg)
+    sem = asyncio.Semaphore(CHECK_CONCURRENCY)
+
+    async def probe(uid):
+        async with sem:
+            try:
+                member = await context.bot.get_chat_member(chat_id=g_id, user_id=uid)
+                return member.status
+            except Exception as e:
+                logger.error(f"Error fetching {uid} in {g_id}: {e}")
+                return None
+
+    statuses = await asyncio.gather(*map(probe, removed_list))
     still_in = []
     not_in = []
-    for uid in removed_list:
-        try:
-            member = await context.bot.get_chat_member(chat_id=g_id, user_id=uid)
-            if member.status in ALLOWED_STATUSES:
-                still_in.append(uid)
-            else:
-                not_in.append(uid)
-        except Exception as e:
-            logger.error(f"Error fetching {uid} in {g_id}: {e}")
+    for uid, status in zip(removed_list, statuses):
+        if status in ALLOWED_STATUSES:
+            still_in.append(uid)
+        else:
             not_in.append(uid)
-    resp = f"Check Results for Group {g_id}:\n\n"
+    lines = [f"Check Results for Group {g_id}:", ""]
     if still_in:
-        resp += "These removed users are still in the group:\n"
-        for x in still_in:
-            resp += f"• {x}\n"
+        lines.append("These removed users are still in the group:")
+        lines.extend(f"• {x}" for x in still_in)
     else:
-        resp += "No removed users are still in the group.\n"
-    resp += "\nUsers not in the group (OK):\n"
-    for x in not_in:
-        resp += f"• {x}\n"
-    await context.bot.send_message(
-        chat_id=user.id,
-        text=escape_markdown(resp, version=2), parse_mode='MarkdownV2'
-    )
-    for x in still_in:
+        lines.append("No removed users are still in the group.")
+    lines += ["", "Users not in the group (OK):"]
+    lines.extend(f"• {x}" for x in not_in)
+
+    async def ban(x):
         try:
             await context.bot.ban_chat_member(chat_id=g_id, user_id=x)
             logger.info(f"Auto-banned {x} after /check in {g_id}.")
         except Exception as e:
             logger.error(f"Failed ban {x} in {g_id}: {e}")
 
+    async def ban_all():
+        # One concurrent wave per second keeps large clean-ups under the flood limit.
+        for i in range(0, len(still_in), CHECK_BANS_PER_SECOND):
+            if i:
+                await asyncio.sleep(1)
+            await asyncio.gather(*map(ban, still_in[i:i + CHECK_BANS_PER_SECOND]))
+
+    async def send_report():
+        for part in split_message(lines):
+            await _plain(context, user.id, part)
+
+    # The report and the bans are independent API calls; issue them together.
+    await asyncio.gather(send_report(), ban_all())
+
 async def link_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     if user.id != ALLOWED_USER_ID:
         return
     if len(context.args) != 1:
-        msg = "⚠️ Usage: /link <group_id>"
         return await context.bot.send_message(
             chat_id=user.id,
-            text=escape_markdown(msg, version=2), parse_mode='MarkdownV2'
+            text=USAGE_MD["link"], parse_mode='MarkdownV2'
         )
-    try:
-        g_id = int(context.args[0])
-    except ValueError:
+    parsed = _parse_ints(context, 1)
+    if parsed is None:
         w = "⚠️ group_id must be integer."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(w, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, w)
+    g_id = parsed[0]
     if not group_exists(g_id):
         e = f"⚠️ Group {g_id} is not registered."
-        return await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(e, version=2), parse_mode='MarkdownV2'
-        )
+        return await _plain(context, user.id, e)
     try:
         invite_link_obj = await context.bot.create_chat_invite_link(
             chat_id=g_id,
@@ -1208,20 +1559,54 @@ async def link_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
             name="One-Time Link"
         )
         cf = f"✅ One-time invite link for group {g_id}:\n\n{invite_link_obj.invite_link}"
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(cf, version=2), parse_mode='MarkdownV2'
-        )
+        await _plain(context, user.id, cf)
         logger.info(f"Created one-time link for {g_id}: {invite_link_obj.invite_link}")
     except Exception as e:
         logger.error(f"Error creating link for {g_id}: {e}")
         err = "⚠️ Could not create invite link. Check bot admin rights & logs."
-        await context.bot.send_message(
-            chat_id=user.id,
-            text=escape_markdown(err, version=2), parse_mode='MarkdownV2'
-        )
+        await _plain(context, user.id, err)
+
+# ------------------- Command Table -------------------
+COMMANDS = {
+    "start": start_cmd,
+    "help": help_cmd,
+    "group_add": group_add_cmd,
+    "rmove_group": rmove_group_cmd,
+    "bypass": bypass_cmd,
+    "unbypass": unbypass_cmd,
+    "love": love_cmd,
+    "back_group": back_group_cmd,
+    "rmove_user": rmove_user_cmd,
+    "mute": mute_cmd,
+    "unmute": unmute_cmd,
+    "limit": limit_cmd,
+    "slow": slow_cmd,
+    "be_sad": be_sad_cmd,
+    "be_happy": be_happy_cmd,
+    "check": check_cmd,
+    "link": link_cmd,
+    "permission_type": permission_type_cmd,
+    "get_id": get_id_cmd,
+}
+
+async def dispatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Route a command to its handler with one dict lookup, instead of PTB
+    testing each of the CommandHandlers in turn.
+    """
+    # "/cmd@BotName args" -> "cmd"; CommandHandler has already matched it.
+    name = update.effective_message.text.split(None, 1)[0][1:].split('@', 1)[0].lower()
+    await COMMANDS[name](update, context)
 
 def main():
+    # Taken here rather than at import: OCR workers import this module too.
+    lock_fd = acquire_lock()
+    atexit.register(release_lock, lock_fd)
+
+    # Before any DB connection or thread exists.
+    if ocr_available or pdf_available:
+        start_ocr_pool()
+
     try:
         init_db()
     except Exception:
@@ -1237,50 +1622,49 @@ def main():
         TOKEN = TOKEN[4:].strip()
 
     try:
-        app = ApplicationBuilder().token(TOKEN).build()
+        # Handlers share state only through the event loop and the locked DB
+        # connection, so updates can be processed concurrently.
+        # Concurrent handlers each need a connection; PTB's default pool of
+        # one makes them queue behind each other for it.
+        app = (
+            ApplicationBuilder()
+            .token(TOKEN)
+            .concurrent_updates(True)
+            .connection_pool_size(BOT_CONNECTION_POOL_SIZE)
+            .pool_timeout(5.0)
+            .connect_timeout(5.0)
+            .read_timeout(20.0)
+            .build()
+        )
     except Exception as e:
         logger.critical(f"Failed building bot: {e}")
         sys.exit("Bot build error.")
 
     # Register handlers
-    app.add_handler(CommandHandler("start", start_cmd))
-    app.add_handler(CommandHandler("help", help_cmd))
-    app.add_handler(CommandHandler("group_add", group_add_cmd))
-    app.add_handler(CommandHandler("rmove_group", rmove_group_cmd))
-    app.add_handler(CommandHandler("bypass", bypass_cmd))
-    app.add_handler(CommandHandler("unbypass", unbypass_cmd))
-    app.add_handler(CommandHandler("love", love_cmd))
-    app.add_handler(CommandHandler("back_group", back_group_cmd))
-    app.add_handler(CommandHandler("rmove_user", rmove_user_cmd))
-    app.add_handler(CommandHandler("mute", mute_cmd))
-    app.add_handler(CommandHandler("unmute", unmute_cmd))
-    app.add_handler(CommandHandler("limit", limit_cmd))
-    app.add_handler(CommandHandler("slow", slow_cmd))
-    app.add_handler(CommandHandler("be_sad", be_sad_cmd))
-    app.add_handler(CommandHandler("be_happy", be_happy_cmd))
-    app.add_handler(CommandHandler("check", check_cmd))
-    app.add_handler(CommandHandler("link", link_cmd))
-    app.add_handler(CommandHandler("permission_type", permission_type_cmd))
-    app.add_handler(CommandHandler("get_id", get_id_cmd))
-
-    # Message handlers
-    app.add_handler(MessageHandler(
-        filters.TEXT | filters.CAPTION | filters.Document.ALL | filters.PHOTO,
-        delete_arabic_messages
-    ))
-    app.add_handler(MessageHandler(
-        filters.ALL,
-        delete_any_messages
-    ))
-    app.add_handler(MessageHandler(
-        filters.TEXT & ~filters.COMMAND,
-        handle_group_name_reply
-    ))
+    # One CommandHandler for every command; dispatch_command picks the callback.
+    app.add_handler(CommandHandler(tuple(COMMANDS), dispatch_command))
+
+    # Message handler
+    app.add_handler(MessageHandler(RoutableMessage(), route_message))
 
     app.add_error_handler(error_handler)
 
-    logger.info("Bot starting.")
-    app.run_polling()
+    # With WEBHOOK_URL set, Telegram pushes updates over parallel connections
+    # instead of the bot long-polling getUpdates one batch at a time.
+    # Needs the python-telegram-bot[webhooks] extra.
+    webhook_url = os.getenv('WEBHOOK_URL')
+    if webhook_url:
+        logger.info("Bot starting (webhook).")
+        app.run_webhook(
+            listen='0.0.0.0',
+            port=int(os.getenv('PORT', '8443')),
+            webhook_url=webhook_url,
+            secret_token=os.getenv('WEBHOOK_SECRET'),
+            max_connections=min(100, (os.cpu_count() or 1) * 10)
+        )
+    else:
+        logger.info("Bot starting (polling).")
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
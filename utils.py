@@ -1,8 +1,26 @@
 # utils.py
 
+import re
+
+# Arabic, Arabic Supplement, Arabic Extended-A and both presentation-form blocks.
+ARABIC_PATTERN = re.compile(r'[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]')
+
+# Every byte except the UTF-8 lead bytes those blocks can start with:
+# D8-DB (U+0600-06FF), DD (U+0740-077F), E0 (U+0800-0FFF), EF (U+F000-FFFF).
+_NON_ARABIC_LEAD_BYTES = bytes(
+    b for b in range(256) if b not in (0xD8, 0xD9, 0xDA, 0xDB, 0xDD, 0xE0, 0xEF)
+)
+
 def is_arabic(text):
     """
     Check if the given text contains Arabic characters.
     """
-    arabic_range = range(0x0600, 0x06FF + 1)
-    return any(ord(char) in arabic_range for char in text)
+    # isascii() reads a flag CPython keeps on the str object, so pure-ASCII
+    # messages (the common case) never reach the regex scan.
+    if text.isascii():
+        return False
+    # Other non-ASCII text (Latin accents, Cyrillic, most emoji) is ruled out
+    # by one C-level byte filter; only survivors need the regex.
+    if not text.encode('utf-8', 'surrogatepass').translate(None, _NON_ARABIC_LEAD_BYTES):
+        return False
+    return ARABIC_PATTERN.search(text) is not None
@@ -1,17 +1,34 @@
 # warning_handler.py
 
-import re
+import asyncio
 import sqlite3
+import time
+import queue
 import logging
-from datetime import datetime
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.error import Forbidden
 from telegram.helpers import escape_markdown
 
+from utils import is_arabic
+
 DATABASE = 'warnings.db'
 logger = logging.getLogger(__name__)
 
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'  # UTC, as stored in warnings_history
+GROUP_CACHE_TTL = 300  # Seconds a cached group lookup stays valid
+BYPASS_CACHE_TTL = 60  # Seconds the cached bypass list stays valid
+WARNING_WORKERS = 8  # Background tasks delivering warnings
+WARNING_QUEUE_SIZE = 1000  # Pending deliveries per worker before handlers wait
+READ_POOL_SIZE = 4  # Idle reader connections kept open
+SEND_RATE = 25  # Bot API sends per second, under Telegram's ~30/s bot limit
+PER_CHAT_INTERVAL = 1.0  # Average seconds between sends to one chat
+PER_CHAT_BURST = 3  # Sends one chat may receive back to back before spacing applies
+USER_INFO_CACHE_SIZE = 10000  # Users whose last-written details are remembered
+
 REGULATIONS_MESSAGE = """
 *Communication Channels Regulation*
 
@@ -26,69 +43,151 @@ Please note that not complying with the above-mentioned regulation will result i
 3- Third warning sent to the student. May be addressed to DISCIPLINARY COMMITTEE.
 """
 
-def is_arabic(text):
-    return bool(re.search(r'[\u0600-\u06FF]', text))
+# Reason for the first, second and third-or-later warning.
+REASON_LINES = (
+    "1- Primary warning sent to the student.",
+    "2- Second warning sent to the student.",
+    "3- Third warning sent to the student. May be addressed to DISCIPLINARY COMMITTEE.",
+)
 
-def get_user_warnings(user_id):
-    try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('SELECT warnings FROM warnings WHERE user_id = ?', (user_id,))
-        row = c.fetchone()
-        conn.close()
-        warnings = row[0] if row else 0
-        logger.debug(f"User {user_id} has {warnings} warnings.")
-        return warnings
-    except Exception as e:
-        logger.error(f"Error retrieving warnings for user {user_id}: {e}")
-        return 0
+# The private alarm for each warning level, built once at import.
+ALARM_MESSAGES = tuple(f"{REGULATIONS_MESSAGE}\n\n{reason}" for reason in REASON_LINES)
+
+# The report to TARAs is MarkdownV2, so its fixed parts are escaped once here
+# and user-supplied fields go through md().
+REASON_LINES_MD = tuple(escape_markdown(reason, version=2) for reason in REASON_LINES)
+ALARM_SENT_MD = escape_markdown("✅ Alarm sent to user.", version=2)
+
+def md(value):
+    return escape_markdown(str(value), version=2)
+
+def _open_conn():
+    """
+    Open a connection with the per-connection PRAGMAs applied.
+    """
+    conn = sqlite3.connect(DATABASE, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+# The writer connection, opened on first use. isolation_level=None keeps
+# each statement in autocommit, so the helpers need no commit().
+_conn = None
+
+# Serialises writes on the shared connection.
+_write_lock = threading.Lock()
 
-def update_warnings(user_id, warnings):
+def get_conn():
+    """
+    Return the module's shared writer connection.
+    """
+    global _conn
+    if _conn is None:
+        _conn = _open_conn()
+        ensure_indexes(_conn)
+    return _conn
+
+# Idle reader connections. Under WAL, readers never block the writer or each
+# other, so lookups from different worker threads run in parallel instead of
+# queueing on the writer connection (and never see its open transaction).
+_read_pool = queue.Queue(maxsize=READ_POOL_SIZE)
+
+@contextmanager
+def read_conn():
+    """
+    Borrow a pooled reader connection, opening one if none is idle.
+    """
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO warnings (user_id, warnings)
-            VALUES (?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET warnings=excluded.warnings
-        ''', (user_id, warnings))
-        conn.commit()
-        conn.close()
-        logger.debug(f"Updated warnings for user {user_id} to {warnings}")
-    except Exception as e:
-        logger.error(f"Error updating warnings for user {user_id}: {e}")
-        raise
+        conn = _read_pool.get_nowait()
+    except queue.Empty:
+        conn = _open_conn()
+    try:
+        yield conn
+    finally:
+        try:
+            _read_pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+def ensure_indexes(conn):
+    """
+    Create the indexes behind the per-message lookups, where their tables exist.
+    """
+    indexes = (
+        # Covering index: get_group_taras is answered from the index alone.
+        'CREATE INDEX IF NOT EXISTS idx_tara_links_group ON tara_links(group_id, tara_user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_warnings_history_user ON warnings_history(user_id, timestamp)',
+    )
+    for sql in indexes:
+        try:
+            conn.execute(sql)
+        except sqlite3.Error as e:
+            logger.debug(f"Skipped index ({e}): {sql}")
+
+def utc_timestamp():
+    """
+    Return the current UTC time formatted for warnings_history.
+    """
+    # time.strftime on a gmtime() struct skips building a datetime object.
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime())
 
-def log_warning(user_id, warning_number, group_id):
+def record_warning(user_id, group_id, timestamp=None):
+    """
+    Increment a user's warning count and log it in one transaction; return the new count.
+    """
+    conn = get_conn()
+    if timestamp is None:
+        timestamp = utc_timestamp()
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-        c.execute('''
-            INSERT INTO warnings_history (user_id, warning_number, timestamp, group_id)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, warning_number, timestamp, group_id))
-        conn.commit()
-        conn.close()
-        logger.debug(f"Logged warning {warning_number} for user {user_id} in group {group_id} at {timestamp}")
+        with _write_lock:
+            # IMMEDIATE takes SQLite's write lock up front, so a writer on
+            # another connection cannot make this transaction fail mid-way
+            # when it upgrades from reading to writing.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # The UPSERT increments in place, so concurrent warnings for
+                # the same user cannot both read N and write N+1.
+                warnings = conn.execute('''
+                    INSERT INTO warnings (user_id, warnings)
+                    VALUES (?, 1)
+                    ON CONFLICT(user_id) DO UPDATE SET warnings = warnings + 1
+                    RETURNING warnings
+                ''', (user_id,)).fetchone()[0]
+                conn.execute('''
+                    INSERT INTO warnings_history (user_id, warning_number, timestamp, group_id)
+                    VALUES (?, ?, ?, ?)
+                ''', (user_id, warnings, timestamp, group_id))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        logger.debug(f"Recorded warning {warnings} for user {user_id} in group {group_id} at {timestamp}")
+        return warnings
     except Exception as e:
-        logger.error(f"Error logging warning for user {user_id} in group {group_id}: {e}")
+        logger.error(f"Error recording warning for user {user_id} in group {group_id}: {e}")
         raise
 
+# user_id -> (first_name, last_name, username) as last written, so repeat
+# messages from the same user skip the users-table write. Only touched from
+# the event loop; least recently seen users go first.
+_user_info_written = OrderedDict()
+
 def update_user_info(user):
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO users (user_id, first_name, last_name, username)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                first_name=excluded.first_name,
-                last_name=excluded.last_name,
-                username=excluded.username
-        ''', (user.id, user.first_name, user.last_name, user.username))
-        conn.commit()
-        conn.close()
+        with _write_lock:
+            c = get_conn().cursor()
+            c.execute('''
+                INSERT INTO users (user_id, first_name, last_name, username)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    first_name=excluded.first_name,
+                    last_name=excluded.last_name,
+                    username=excluded.username
+            ''', (user.id, user.first_name, user.last_name, user.username))
         logger.debug(f"Updated user info for user {user.id}")
     except Exception as e:
         logger.error(f"Error updating user info for user {user.id}: {e}")
@@ -96,11 +195,8 @@ def update_user_info(user):
 
 def group_exists(group_id):
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('SELECT 1 FROM groups WHERE group_id = ?', (group_id,))
-        exists = c.fetchone() is not None
-        conn.close()
+        with read_conn() as conn:
+            exists = conn.execute('SELECT 1 FROM groups WHERE group_id = ?', (group_id,)).fetchone() is not None
         logger.debug(f"Checked existence of group {group_id}: {exists}")
         return exists
     except Exception as e:
@@ -109,11 +205,8 @@ def group_exists(group_id):
 
 def get_group_taras(g_id):
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('SELECT tara_user_id FROM tara_links WHERE group_id = ?', (g_id,))
-        rows = c.fetchall()
-        conn.close()
+        with read_conn() as conn:
+            rows = conn.execute('SELECT tara_user_id FROM tara_links WHERE group_id = ?', (g_id,)).fetchall()
         taras = [r[0] for r in rows]
         logger.debug(f"Group {g_id} has TARAs: {taras}")
         return taras
@@ -121,19 +214,225 @@ def get_group_taras(g_id):
         logger.error(f"Error retrieving TARAs for group {g_id}: {e}")
         return []
 
+# g_id -> (expires_at, exists, group_name, taras). Groups and their TARA links
+# change only through admin commands, so the per-message lookups are served
+# from here. The writers live in other modules, so entries are not invalidated
+# on write: a change takes up to GROUP_CACHE_TTL seconds to be seen here.
+_group_cache = {}
+
+def load_group_info(g_id):
+    """
+    Read a group's registration, name and TARAs, and cache them.
+    Unlike group_exists() and get_group_taras(), errors propagate here, so a
+    transient failure is never cached as "not registered" or "no TARAs".
+    """
+    with read_conn() as conn:
+        row = conn.execute('SELECT group_name FROM groups WHERE group_id = ?', (g_id,)).fetchone()
+        rows = conn.execute('SELECT tara_user_id FROM tara_links WHERE group_id = ?', (g_id,)).fetchall()
+    group_name = row[0] if row and row[0] else "No Name Set"
+    info = (row is not None, group_name, [r[0] for r in rows])
+    _group_cache[g_id] = (time.monotonic() + GROUP_CACHE_TTL,) + info
+    return info
+
+def cached_group_info(g_id):
+    """
+    Return the cached (exists, group_name, taras) for a group, or None if absent or expired.
+    """
+    entry = _group_cache.get(g_id)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    return entry[1:]
+
 def is_bypass_user(user_id):
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('SELECT 1 FROM bypass_users WHERE user_id = ?', (user_id,))
-        res = c.fetchone() is not None
-        conn.close()
+        with read_conn() as conn:
+            res = conn.execute('SELECT 1 FROM bypass_users WHERE user_id = ?', (user_id,)).fetchone() is not None
         logger.debug(f"Checked if user {user_id} is bypassed: {res}")
         return res
     except Exception as e:
         logger.error(f"Error checking bypass status for user {user_id}: {e}")
         return False
 
+# The whole bypass list, reloaded once it is BYPASS_CACHE_TTL seconds old.
+# /bypass and /unbypass write it from main.py, so there is no invalidation on
+# write: a change takes up to BYPASS_CACHE_TTL seconds to reach the warning path.
+_bypass_users = frozenset()
+_bypass_expires_at = 0.0
+
+def load_bypass_users():
+    """
+    Read every bypassed user ID into the in-memory set and return it.
+    """
+    global _bypass_users, _bypass_expires_at
+    try:
+        with read_conn() as conn:
+            rows = conn.execute('SELECT user_id FROM bypass_users').fetchall()
+        _bypass_users = frozenset(r[0] for r in rows)
+        _bypass_expires_at = time.monotonic() + BYPASS_CACHE_TTL
+        logger.debug(f"Loaded {len(_bypass_users)} bypass user(s).")
+    except Exception as e:
+        logger.error(f"Error loading bypass users: {e}")
+    return _bypass_users
+
+def cached_bypass_users():
+    """
+    Return the cached bypass set, or None once it has expired.
+    """
+    return _bypass_users if _bypass_expires_at > time.monotonic() else None
+
+async def run_db(func, *args):
+    """
+    Run a blocking DB helper in a worker thread so the event loop keeps serving other chats.
+    """
+    return await asyncio.to_thread(func, *args)
+
+# ------------------- Send Throttling -------------------
+
+# Bot-wide: the time of the next free send slot. Per chat: the theoretical
+# arrival time of that chat's next send (GCRA), which lets a chat take a
+# short burst, such as a TARA's report plus forward, while averaging one send
+# per PER_CHAT_INTERVAL. Reading and updating them involves no await, so the
+# event loop needs no lock here.
+_next_send_at = 0.0
+_chat_tat = {}
+
+async def throttle(chat_id):
+    """
+    Wait for a send slot for chat_id so bursts stay under Telegram's limits instead of hitting 429s.
+    """
+    global _next_send_at
+    loop = asyncio.get_running_loop()
+    # First wait for this chat's own allowance. Nothing bot-wide is reserved
+    # yet, so one chat's wait never delays sends to other chats.
+    now = loop.time()
+    tat = max(now, _chat_tat.get(chat_id, 0.0))
+    at = max(now, tat - (PER_CHAT_BURST - 1) * PER_CHAT_INTERVAL)
+    _chat_tat[chat_id] = tat + PER_CHAT_INTERVAL
+    if len(_chat_tat) > 10000:
+        for stale in [c for c, t in _chat_tat.items() if t < now]:
+            del _chat_tat[stale]
+    if at > now:
+        await asyncio.sleep(at - now)
+    # Then take the next bot-wide slot, reserved only once this chat is due,
+    # so _next_send_at runs ahead of now only by sends actually queued.
+    now = loop.time()
+    start = max(now, _next_send_at)
+    _next_send_at = start + 1 / SEND_RATE
+    if start > now:
+        await asyncio.sleep(start - now)
+
+async def deliver_warning(bot, message, warnings_count, group_name, group_taras, timestamp):
+    """
+    Send the alarm to the warned user and the report to the group's TARAs.
+    """
+    user = message.from_user
+    level = min(warnings_count, 3) - 1
+    full_name = f"{user.first_name or ''} {user.last_name or ''}".strip() or "N/A"
+    username_display = f"@{user.username}" if user.username else "NoUsername"
+
+    # Attempt to send a private message to the user
+    alarm_message = ALARM_MESSAGES[level]
+    try:
+        await throttle(user.id)
+        await bot.send_message(
+            chat_id=user.id,
+            text=alarm_message,
+            parse_mode='Markdown'
+        )
+        logger.info(f"Sent alarm message to user {user.id}.")
+        user_notification = ALARM_SENT_MD
+    except Forbidden:
+        logger.error(f"Cannot send PM to user {user.id}. They might not have started the bot.")
+        user_notification = (
+            f"⚠️ User `{user.id}` hasn't started the bot\\.\n"
+            f"*Full Name:* {md(full_name)}\n"
+            f"*Username:* {md(username_display)}"
+        )
+    except Exception as e:
+        logger.error(f"Error sending PM to user {user.id}: {e}")
+        user_notification = f"⚠️ Error sending alarm to user `{user.id}`: {md(e)}"
+
+    # Notify TARAs linked to this group
+    if not group_taras:
+        logger.debug(f"No TARAs linked to group {message.chat_id}.")
+
+    alarm_report = (
+        f"*Alarm Report*\n"
+        f"*Group:* {md(group_name)}\n"
+        f"*Group ID:* `{message.chat_id}`\n"
+        f"*Student ID:* `{user.id}`\n"
+        f"*Full Name:* {md(full_name)}\n"
+        f"*Username:* {md(username_display)}\n"
+        f"*Number of Warnings:* `{warnings_count}`\n"
+        f"*Reason:* {REASON_LINES_MD[level]}\n"
+        f"*Date:* {md(timestamp)} UTC\n"
+        f"{user_notification}\n"
+    )
+
+    async def notify_tara(t_id):
+        await throttle(t_id)
+        await bot.send_message(
+            chat_id=t_id,
+            text=alarm_report,
+            parse_mode='MarkdownV2'
+        )
+        # Forward the original Arabic message to the TARA
+        await throttle(t_id)
+        await bot.forward_message(
+            chat_id=t_id,
+            from_chat_id=message.chat_id,
+            message_id=message.message_id
+        )
+
+    # Each TARA gets the report then the forward, in order; different
+    # TARAs are notified concurrently.
+    results = await asyncio.gather(
+        *(notify_tara(t_id) for t_id in group_taras),
+        return_exceptions=True
+    )
+    for t_id, result in zip(group_taras, results):
+        if isinstance(result, Forbidden):
+            logger.error(f"Cannot send message to TARA {t_id}. They might have blocked the bot.")
+        elif isinstance(result, Exception):
+            logger.error(f"Error sending message to TARA {t_id}: {result}")
+        else:
+            logger.info(f"Sent alarm report and forwarded message to TARA {t_id}.")
+
+# ------------------- Warning Delivery Workers -------------------
+
+# One queue per worker; a group always maps to the same worker, so its
+# warnings are delivered in order while different groups proceed in parallel.
+_warning_queues = []
+_warning_tasks = []  # Strong references so the worker tasks are not collected
+
+async def _warning_worker(queue):
+    while True:
+        job = await queue.get()
+        try:
+            await deliver_warning(*job)
+        except Exception as e:
+            logger.error(f"Error delivering warning: {e}")
+        finally:
+            queue.task_done()
+
+def _start_warning_workers():
+    """
+    Create the delivery queues and their worker tasks on the running loop.
+    """
+    for _ in range(WARNING_WORKERS):
+        queue = asyncio.Queue(maxsize=WARNING_QUEUE_SIZE)
+        _warning_queues.append(queue)
+        _warning_tasks.append(asyncio.get_running_loop().create_task(_warning_worker(queue)))
+    logger.info(f"Started {WARNING_WORKERS} warning delivery workers.")
+
+async def enqueue_warning(g_id, job):
+    """
+    Queue a deliver_warning() job on the worker that owns the group.
+    """
+    if not _warning_queues:
+        _start_warning_workers()
+    await _warning_queues[g_id % WARNING_WORKERS].put(job)
+
 async def handle_warnings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     if not message or not message.text:
@@ -144,10 +443,23 @@ async def handle_warnings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = message.chat
     g_id = chat.id
 
+    # Warnings only apply in groups; private chats and channels need no lookups.
+    if chat.type not in ('group', 'supergroup'):
+        return
+
     logger.debug(f"Processing message from user {user.id} in group {g_id}: {message.text}")
 
     # Ensure this is a registered group
-    if not group_exists(g_id):
+    group_info = cached_group_info(g_id)
+    if group_info is None:
+        try:
+            group_info = await run_db(load_group_info, g_id)
+        except Exception as e:
+            # Nothing was cached, so the next message retries the lookup.
+            logger.error(f"Error loading group info for {g_id}: {e}")
+            return
+    registered, group_name, group_taras = group_info
+    if not registered:
         logger.warning(f"Group {g_id} is not registered.")
         try:
             await message.reply_text(
@@ -158,106 +470,43 @@ async def handle_warnings(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Check if user is in bypass list
-    if is_bypass_user(user.id):
+    bypass_users = cached_bypass_users()
+    if bypass_users is None:
+        bypass_users = await run_db(load_bypass_users)
+    if user.id in bypass_users:
         logger.debug(f"User {user.id} is bypassed from warnings.")
         return  # Do not process warnings for bypassed users
 
-    # Update user info in the database
-    try:
-        update_user_info(user)
-    except Exception as e:
-        logger.error(f"Failed to update user info for user {user.id}: {e}")
+    # Update user info in the database, unless it is unchanged since the last write
+    user_info = (user.first_name, user.last_name, user.username)
+    if _user_info_written.get(user.id) == user_info:
+        _user_info_written.move_to_end(user.id)
+    else:
+        try:
+            await run_db(update_user_info, user)
+            _user_info_written[user.id] = user_info
+            _user_info_written.move_to_end(user.id)
+            if len(_user_info_written) > USER_INFO_CACHE_SIZE:
+                _user_info_written.popitem(last=False)
+        except Exception as e:
+            logger.error(f"Failed to update user info for user {user.id}: {e}")
 
     # Check if the message contains Arabic
     if is_arabic(message.text):
+        # One timestamp for the history row and the report.
+        timestamp = utc_timestamp()
         try:
-            warnings_count = get_user_warnings(user.id) + 1
-            update_warnings(user.id, warnings_count)
-            log_warning(user.id, warnings_count, g_id)
+            warnings_count = await run_db(record_warning, user.id, g_id, timestamp)
             logger.info(f"User {user.id} now has {warnings_count} warnings.")
         except Exception as e:
             logger.error(f"Failed to update warnings for user {user.id}: {e}")
             return
 
-        if warnings_count == 1:
-            reason_line = "1- Primary warning sent to the student."
-        elif warnings_count == 2:
-            reason_line = "2- Second warning sent to the student."
-        else:
-            reason_line = "3- Third warning sent to the student. May be addressed to DISCIPLINARY COMMITTEE."
-
-        # Attempt to send a private message to the user
-        alarm_message = f"{REGULATIONS_MESSAGE}\n\n{reason_line}"
-        try:
-            await context.bot.send_message(
-                chat_id=user.id,
-                text=alarm_message,
-                parse_mode='Markdown'
-            )
-            logger.info(f"Sent alarm message to user {user.id}.")
-            user_notification = "✅ Alarm sent to user."
-        except Forbidden:
-            logger.error(f"Cannot send PM to user {user.id}. They might not have started the bot.")
-            user_notification = (
-                f"⚠️ User `{user.id}` hasn't started the bot.\n"
-                f"**Full Name:** {user.first_name or 'N/A'} {user.last_name or ''}\n"
-                f"**Username:** @{user.username if user.username else 'N/A'}"
-            )
-        except Exception as e:
-            logger.error(f"Error sending PM to user {user.id}: {e}")
-            user_notification = f"⚠️ Error sending alarm to user `{user.id}`: {e}"
-
-        # Notify TARAs linked to this group
-        group_taras = get_group_taras(g_id)
-        if not group_taras:
-            logger.debug(f"No TARAs linked to group {g_id}.")
-
-        # Fetch group name
-        try:
-            conn = sqlite3.connect(DATABASE)
-            c = conn.cursor()
-            c.execute('SELECT group_name FROM groups WHERE group_id = ?', (g_id,))
-            group_row = c.fetchone()
-            conn.close()
-            group_name = group_row[0] if group_row and group_row[0] else "No Name Set"
-        except Exception as e:
-            group_name = "No Name Set"
-            logger.error(f"Error retrieving group name for {g_id}: {e}")
-
-        full_name = f"{user.first_name or ''} {user.last_name or ''}".strip() or "N/A"
-        username_display = f"@{user.username}" if user.username else "NoUsername"
-
-        alarm_report = (
-            f"**Alarm Report**\n"
-            f"**Group:** {escape_markdown(group_name, version=2)}\n"
-            f"**Group ID:** `{g_id}`\n"
-            f"**Student ID:** `{user.id}`\n"
-            f"**Full Name:** {escape_markdown(full_name, version=2)}\n"
-            f"**Username:** {escape_markdown(username_display, version=2)}\n"
-            f"**Number of Warnings:** `{warnings_count}`\n"
-            f"**Reason:** {reason_line}\n"
-            f"**Date:** {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC\n"
-            f"{user_notification}\n"
+        # Delivery runs on the group's worker, so slow or rate-limited sends
+        # never hold up this update; put() waits only if that worker is backlogged.
+        await enqueue_warning(
+            g_id, (context.bot, message, warnings_count, group_name, group_taras, timestamp)
         )
-
-        for t_id in group_taras:
-            try:
-                await context.bot.send_message(
-                    chat_id=t_id,
-                    text=alarm_report,
-                    parse_mode='Markdown'
-                )
-                # Forward the original Arabic message to the TARA
-                await context.bot.forward_message(
-                    chat_id=t_id,
-                    from_chat_id=chat.id,
-                    message_id=message.message_id
-                )
-                logger.info(f"Sent alarm report and forwarded message to TARA {t_id}.")
-            except Forbidden:
-                logger.error(f"Cannot send message to TARA {t_id}. They might have blocked the bot.")
-            except Exception as e:
-                logger.error(f"Error sending message to TARA {t_id}: {e}")
     else:
         logger.debug("No Arabic characters detected in the message.")
 